@@ -2,110 +2,310 @@ import argparse
 import asyncio
 import json
 import logging
+import re
+import socket
+import time
+from collections.abc import Callable
 from functools import partial
-from typing import Literal, cast
+from typing import cast
 
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import websockets
-from pandas.core.groupby.generic import DataFrameGroupBy
 from websockets.asyncio.server import ServerConnection, serve
 from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
 
-TradeQueue = asyncio.Queue[tuple[pd.Timestamp, list[str], int] | None]
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
-async def produce_trades(queue: TradeQueue, trades_df: pd.DataFrame) -> None:
-    """Processes trades from a DataFrame and puts them into a queue."""
-    logging.info("Producer: Starting to process trades.")
-    try:
-        grouped_trades: DataFrameGroupBy[pd.Timestamp, Literal[True]] = (
-            trades_df.groupby("timestamp")
-        )  # pyright: ignore[reportAssignmentType]
-        for timestamp, group in grouped_trades:
-            messages = [
-                json.dumps(record, default=str)
-                for record in group.to_dict(orient="records")
-            ]
-            await queue.put((timestamp, messages, len(group)))
-    except asyncio.CancelledError:
-        logging.info("Producer: Task was cancelled.")
-    finally:
-        await queue.put(None)
-        logging.info("Producer: Finished processing trades.")
+try:
+    import orjson
+
+    _ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: object) -> bytes:
+        """Serializes an object to JSON bytes using orjson."""
+        return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+except ImportError:
+
+    def dumps(obj: object) -> bytes:
+        """Serializes an object to JSON bytes using the stdlib json module."""
+        return json.dumps(obj, default=str).encode()
+
+
+TradeGroups = list[tuple[int, bytes, int]]
+
+
+def _scan_ready(deltas: np.ndarray, i: int, elapsed_ns: int, window_ns: int) -> int:
+    """Returns the index just past the last group due within the window."""
+    n = deltas.shape[0]
+    j = i + 1
+    while j < n and deltas[j] - elapsed_ns < window_ns:
+        j += 1
+    return j
+
+
+if njit is not None:
+    _scan_ready = njit(cache=True)(_scan_ready)
+
+# TCP_CORK is Linux-only; corking is skipped elsewhere.
+_TCP_CORK: int | None = getattr(socket, "TCP_CORK", None)
+
+# Groups whose deadline is within this window of the current one are
+# merged into a single frame instead of paying a sleep and a send each.
+_COALESCE_WINDOW_NS = 1_000_000
+
+
+def _configure_socket(websocket: ServerConnection) -> socket.socket | None:
+    """Disables Nagle's algorithm on the connection's TCP socket."""
+    sock: socket.socket | None = websocket.transport.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def _set_cork(sock: socket.socket | None, enabled: bool) -> None:
+    """Corks or uncorks the socket so queued frames leave as one packet."""
+    if sock is not None and _TCP_CORK is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, _TCP_CORK, int(enabled))
+
+
+def _timestamps_as_ns(table: pa.Table) -> np.ndarray:
+    """Returns the timestamp column as int64 nanoseconds.
+
+    Parquet files store timestamps in whatever unit they were written with
+    (the sample file uses microseconds); the cast normalizes to the
+    nanoseconds the replay pacing assumes before taking the int64 view.
+    """
+    return table.column("timestamp").cast(pa.timestamp("ns")).to_numpy().view("i8")
+
+
+# Characters that cannot appear raw inside a JSON string literal.
+_JSON_ESCAPES = re.compile(r'["\\\x00-\x1f]')
+
+
+def _format_json_string(value: str) -> str:
+    """Quotes a string for embedding in generated JSON.
+
+    Typical values (tickers) contain nothing that needs escaping and take
+    the concatenation fast path; anything with a quote, backslash or
+    control character goes through json.dumps for full escaping.
+    """
+    if _JSON_ESCAPES.search(value) is None:
+        return '"' + value + '"'
+    return json.dumps(value)
+
+
+def _compile_row_encoder(table: pa.Table) -> Callable[[tuple], str] | None:
+    """Generates a row-to-JSON encoder specialized to the table's schema.
+
+    The field list, types and quoting rules are fixed once the parquet is
+    loaded, so the emitted function formats one row (a tuple of column
+    values) as a JSON object with no dict construction or per-field type
+    dispatch. Returns None when a column's type (or the presence of nulls)
+    has no specialized formatter, in which case the caller falls back to
+    the generic encoder.
+    """
+    chunks: list[str] = []
+    for index, field in enumerate(table.schema):
+        if table.column(field.name).null_count:
+            return None
+        value = f"row[{index}]"
+        field_type = field.type
+        if pa.types.is_integer(field_type):
+            expr = f"repr({value})"
+        elif pa.types.is_floating(field_type):
+            # NaN/inf are valid Arrow floats but not valid JSON, and they
+            # slip past the null_count guard; such columns take the
+            # generic-encoder fallback.
+            if not np.isfinite(table.column(field.name).to_numpy()).all():
+                return None
+            expr = f"repr({value})"
+        elif pa.types.is_boolean(field_type):
+            expr = f"('true' if {value} else 'false')"
+        elif pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+            expr = f"_format_json_string({value})"
+        elif pa.types.is_timestamp(field_type):
+            expr = f"'\"' + {value}.isoformat() + '\"'"
+        else:
+            return None
+        prefix = "{" if index == 0 else ","
+        chunks.append(repr(prefix + json.dumps(field.name) + ":") + " + " + expr)
+    source = "def encode_row(row):\n    return " + " + ".join(chunks) + " + '}'"
+    namespace: dict[str, object] = {"_format_json_string": _format_json_string}
+    exec(source, namespace)  # noqa: S102 - source is built from the schema only
+    return cast(Callable[[tuple], str], namespace["encode_row"])
+
+
+def load_trades(
+    trade_file: str,
+    columns: list[str] | None = None,
+    wire_format: str = "json",
+) -> tuple[TradeGroups, np.ndarray]:
+    """Reads trade data from a Parquet file and pre-serializes it for replay.
+
+    Returns a list of (timestamp_ns, payload, num_trades) tuples, one per
+    unique timestamp in chronological order, plus an int64 array of each
+    group's offset in nanoseconds from the first timestamp. With the
+    "json" wire format a payload is the group's comma-joined JSON rows
+    without the surrounding array brackets, so the replay loop can splice
+    groups together without copying; with "arrow" it is a complete Arrow
+    IPC stream for the group, decoded zero-copy on the client. Both are built once
+    at startup and shared by all client connections. When `columns` is
+    given, only those columns are read from the file (the timestamp column
+    is always included).
+    """
+    if columns is not None and "timestamp" not in columns:
+        columns = ["timestamp", *columns]
+    table = pq.read_table(trade_file, columns=columns, memory_map=True)
+
+    # Trade files are usually written in timestamp order already; only pay
+    # for the sort (a full table copy) when they are not.
+    timestamps_ns = _timestamps_as_ns(table)
+    if not np.all(timestamps_ns[1:] >= timestamps_ns[:-1]):
+        table = table.sort_by("timestamp")
+        timestamps_ns = _timestamps_as_ns(table)
+
+    # The timestamp column is now sorted, so groups are contiguous runs
+    # and np.unique gives their boundaries in a single C pass.
+    unique_ns, starts = np.unique(timestamps_ns, return_index=True)
+    if not len(unique_ns):
+        return [], np.empty(0, dtype=np.int64)
+    bounds = np.append(starts, len(timestamps_ns))
+    deltas_ns = unique_ns - unique_ns[0]
+
+    trades: TradeGroups = []
+
+    if wire_format == "arrow":
+        for timestamp_ns, start, end in zip(
+            unique_ns.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()
+        ):
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table.slice(start, end - start))
+            payload = sink.getvalue().to_pybytes()
+            trades.append((timestamp_ns, payload, end - start))
+        return trades, deltas_ns
+
+    # Convert each column to Python once for the whole table; groups then
+    # become plain list slices instead of per-group Arrow conversions.
+    names = table.column_names
+    column_values = [table.column(name).to_pylist() for name in names]
+    encode_row = _compile_row_encoder(table)
+
+    for timestamp_ns, start, end in zip(
+        unique_ns.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()
+    ):
+        rows = zip(*(column[start:end] for column in column_values))
+        if encode_row is not None:
+            payload = ",".join(map(encode_row, rows)).encode()
+        else:
+            payload = dumps([dict(zip(names, row)) for row in rows])[1:-1]
+        trades.append((timestamp_ns, payload, end - start))
+    return trades, deltas_ns
 
 
 async def replay_trades(
-    websocket: ServerConnection, trade_file: str, max_queue_size: int
+    websocket: ServerConnection,
+    trades: TradeGroups,
+    deltas: np.ndarray,
+    log_interval: int,
+    wire_format: str,
 ) -> None:
-    """Handles a client connection, replaying trade data from a file."""
+    """Handles a client connection, replaying pre-serialized trade data."""
     logging.info(f"Client connected from {websocket.remote_address}")  # pyright: ignore[reportAny]
-    producer_task = None
     try:
-        try:
-            trades_df = pd.read_parquet(trade_file)
-        except FileNotFoundError:
-            logging.error(f"Trade data file not found at {trade_file}")
-            await websocket.send(json.dumps({"error": f"File not found: {trade_file}"}))
-            return
-        except Exception as e:
-            logging.error(f"Error reading parquet file: {e}", exc_info=True)
-            await websocket.send(json.dumps({"error": "Could not read trade data."}))
-            return
-
-        trades_df["timestamp"] = pd.to_datetime(trades_df["timestamp"])
-        trades_df = trades_df.sort_values(by="timestamp").reset_index(drop=True)
-
-        queue: TradeQueue = asyncio.Queue(maxsize=max_queue_size)
-        producer_task = asyncio.create_task(produce_trades(queue, trades_df))
-
-        await websocket.send(json.dumps({"status": "Data loaded. Starting replay."}))
+        sock = _configure_socket(websocket)
+        await websocket.send(dumps({"status": "Data loaded. Starting replay."}))
 
-        first_item = await queue.get()
-        if first_item is None:
+        if not trades:
             logging.info("No trades to replay.")
-            await websocket.send(json.dumps({"status": "Replay finished."}))
+            await websocket.send(dumps({"status": "Replay finished."}))
             return
 
-        first_timestamp, first_messages, num_trades = first_item
-        replay_start_time = asyncio.get_event_loop().time()
+        first_timestamp_ns, first_payload, num_trades = trades[0]
+        replay_start_ns = time.monotonic_ns()
 
-        await asyncio.gather(*(websocket.send(m) for m in first_messages))
+        _set_cork(sock, True)
+        if wire_format == "json":
+            await websocket.send((b"[", first_payload, b"]"))
+        else:
+            await websocket.send(first_payload)
+        _set_cork(sock, False)
         logging.info(
-            f"Sent {num_trades:4} trades for timestamp {first_timestamp} (initial)"
+            f"Sent {num_trades:4} trades for timestamp "
+            f"{np.datetime64(first_timestamp_ns, 'ns')} (initial)"
         )
 
         latencies = []
-        while True:
-            item = await queue.get()
-            if item is None:
-                break
-
-            timestamp, messages, num_trades = item
-
-            time_since_start = (timestamp - first_timestamp).total_seconds()
-            target_send_time = replay_start_time + time_since_start
-
-            current_time = asyncio.get_event_loop().time()
-            delay = target_send_time - current_time
-            if delay > 0:
-                await asyncio.sleep(delay)
+        num_groups = len(trades)
+        log_enabled = logging.getLogger().isEnabledFor(logging.INFO)
+        groups_sent = 0
+        i = 1
+        while i < num_groups:
+            timestamp_ns, payload, num_trades = trades[i]
+            target_ns = replay_start_ns + deltas[i]
 
-            actual_send_time = asyncio.get_event_loop().time()
-            latencies.append(actual_send_time - target_send_time)
+            now_ns = time.monotonic_ns()
+            delay_ns = target_ns - now_ns
+            if delay_ns > 0:
+                await asyncio.sleep(delay_ns / 1e9)
+                now_ns = time.monotonic_ns()
+            latencies.append((now_ns - target_ns) / 1e9)
 
-            await asyncio.gather(*(websocket.send(m) for m in messages))
+            # Merge all groups already due within the coalescing window
+            # into one JSON array so they share a sleep, a frame and a
+            # syscall.
+            elapsed_ns = now_ns - replay_start_ns
+            j = _scan_ready(deltas, i, elapsed_ns, _COALESCE_WINDOW_NS)
+            _set_cork(sock, True)
+            if wire_format == "json":
+                # Sending the fragment list as one fragmented message lets
+                # the library write the pre-built chunks without a
+                # Python-level join; the client receives them reassembled
+                # as a single message.
+                fragments: list[bytes] = [b"[", payload]
+                for k in range(i + 1, j):
+                    num_trades += trades[k][2]
+                    fragments.append(b",")
+                    fragments.append(trades[k][1])
+                fragments.append(b"]")
+                await websocket.send(fragments)
+            else:
+                # Arrow IPC streams are self-contained, so coalesced
+                # groups go out as consecutive messages inside one cork.
+                await websocket.send(payload)
+                for k in range(i + 1, j):
+                    num_trades += trades[k][2]
+                    await websocket.send(trades[k][1])
+            _set_cork(sock, False)
 
-            if delay < 0:
+            groups_sent += 1
+            if delay_ns < 0:
                 logging.warning(
-                    f"Sent {num_trades:4} trades for timestamp {timestamp} (LAGGING by {-delay:.4f} sec)"
+                    f"Sent {num_trades:4} trades for timestamp "
+                    f"{np.datetime64(timestamp_ns, 'ns')} "
+                    f"(LAGGING by {-delay_ns / 1e9:.4f} sec)"
                 )
-            else:
+            elif log_enabled and groups_sent % log_interval == 0:
                 logging.info(
-                    f"Sent {num_trades:4} trades for timestamp {timestamp} (wait for {delay:.4f} sec)"
+                    f"Sent {num_trades:4} trades for timestamp "
+                    f"{np.datetime64(timestamp_ns, 'ns')} "
+                    f"(wait for {delay_ns / 1e9:.4f} sec, "
+                    f"{groups_sent} groups so far)"
                 )
+            i = j
 
         logging.info("Replay finished.")
-        await websocket.send(json.dumps({"status": "Replay finished."}))
+        await websocket.send(dumps({"status": "Replay finished."}))
         if latencies:
             avg_latency = sum(latencies) / len(latencies)
             logging.info(f"Average latency: {avg_latency * 1000:.3f} ms")
@@ -118,27 +318,53 @@ async def replay_trades(
         logging.error(f"An error occurred during replay: {e}", exc_info=True)
         try:
             await websocket.send(
-                json.dumps({"error": f"An unexpected error occurred: {str(e)}"})
+                dumps({"error": f"An unexpected error occurred: {str(e)}"})
             )
         except (ConnectionClosedError, ConnectionClosedOK):
             logging.warning(
                 f"Client {websocket.remote_address} was already disconnected."  # pyright: ignore[reportAny]
             )
     finally:
-        if producer_task:
-            producer_task.cancel()
         logging.info(f"Connection handler finished for {websocket.remote_address}")  # pyright: ignore[reportAny]
 
 
 async def start_server(
-    host: str, port: int, trade_file: str, max_queue_size: int
+    host: str,
+    port: int,
+    trade_file: str,
+    columns: list[str] | None = None,
+    log_interval: int = 100,
+    wire_format: str = "json",
 ) -> None:
     """Starts the WebSocket server with the given configuration."""
+    try:
+        trades, deltas = load_trades(trade_file, columns, wire_format)
+    except FileNotFoundError:
+        logging.critical(f"Trade data file not found at {trade_file}")
+        return
+    except Exception as e:
+        logging.critical(f"Error reading parquet file: {e}", exc_info=True)
+        return
+    logging.info(f"Pre-serialized {len(trades)} timestamp groups from {trade_file}")
+
+    # Warm up the (possibly numba-compiled) scan here so the first client
+    # connection does not absorb the JIT compile inside its pacing loop.
+    _scan_ready(deltas, 0, 0, _COALESCE_WINDOW_NS)
+
     logging.info(f"Starting WebSocket server on ws://{host}:{port}")
     handler = partial(
-        replay_trades, trade_file=trade_file, max_queue_size=max_queue_size
+        replay_trades,
+        trades=trades,
+        deltas=deltas,
+        log_interval=log_interval,
+        wire_format=wire_format,
     )
-    async with serve(handler, host, port):
+    # permessage-deflate costs more CPU than it saves bandwidth for small
+    # JSON frames, and keepalive pings would interleave control frames
+    # with the replay stream.
+    async with serve(
+        handler, host, port, compression=None, max_queue=None, ping_interval=None
+    ):
         await asyncio.Future()  # Run forever
 
 
@@ -158,10 +384,23 @@ def main() -> None:
         help="Path to the Parquet file with trade data.",
     )
     parser.add_argument(
-        "--max-queue-size",
+        "--columns",
+        type=str,
+        default=None,
+        help="Comma-separated list of columns to replay (default: all columns).",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="json",
+        choices=["json", "arrow"],
+        help="Wire format for trade messages: JSON arrays or Arrow IPC streams.",
+    )
+    parser.add_argument(
+        "--log-interval",
         type=int,
         default=100,
-        help="Maximum size of the in-memory trade queue.",
+        help="Log a replay progress line every N groups.",
     )
     parser.add_argument(
         "--log-level",
@@ -178,10 +417,21 @@ def main() -> None:
         format="%(asctime)s - %(levelname)s - %(message)s",
     )
 
+    columns = cast(str, args.columns).split(",") if args.columns else None
+
+    loop_factory = uvloop.new_event_loop if uvloop is not None else None
     try:
-        asyncio.run(
-            start_server(args.host, args.port, args.trade_file, args.max_queue_size)  # pyright: ignore[reportAny]
-        )
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(
+                start_server(
+                    args.host,  # pyright: ignore[reportAny]
+                    args.port,  # pyright: ignore[reportAny]
+                    args.trade_file,  # pyright: ignore[reportAny]
+                    columns,
+                    args.log_interval,  # pyright: ignore[reportAny]
+                    args.format,  # pyright: ignore[reportAny]
+                )
+            )
     except KeyboardInterrupt:
         logging.info("Server stopped by user.")
     except Exception as e: